@@ -0,0 +1,64 @@
+"""
+客户端热点路径: 回调处理器与天气信息格式化
+
+本模块保持为纯Python，可以直接导入；执行 python setup.py build_ext --inplace
+后会生成同名的Cython扩展模块，Python导入时优先加载编译版本。
+"""
+
+import sys
+import logging
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# 自定义回调处理器，记录工具调用过程
+class MCPCallbackHandler(BaseCallbackHandler):
+    """记录MCP工具调用过程的回调处理器"""
+    
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+    
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        logger.debug("LLM开始思考，提示: %.100s...", prompts[0])
+        if self.verbose:
+            sys.stdout.write("\n" + "="*50 + "\n【LLM开始思考】\n")
+    
+    def on_llm_end(self, response, **kwargs):
+        if self.verbose:
+            sys.stdout.write("\n" + "="*50 + "\n【LLM思考完成】\n")
+    
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = serialized.get('name', 'unknown')
+        logger.info("开始执行工具: %s, 输入: %s", name, input_str)
+        if self.verbose:
+            sys.stdout.write("\n" + "-"*50 +
+                             f"\n【开始执行工具】: {name}"
+                             f"\n输入参数: {input_str}\n")
+    
+    def on_tool_end(self, output, **kwargs):
+        logger.info("工具执行完成，输出: %.100s...", output)
+        if self.verbose:
+            sys.stdout.write("\n" + "-"*50 +
+                             "\n【工具执行结果】"
+                             f"\n输出: {output}\n")
+    
+    def on_agent_action(self, action, **kwargs):
+        logger.info("代理决定执行: %s, 输入: %s", action.tool, action.tool_input)
+        if self.verbose:
+            lines = ["\n" + "="*50,
+                     "【代理决策】",
+                     f"选择工具: {action.tool}",
+                     f"工具输入: {action.tool_input}"]
+            if hasattr(action, "log") and action.log:
+                lines.append(f"推理过程: {action.log}")
+            sys.stdout.write("\n".join(lines) + "\n")
+
+# 辅助函数：格式化天气信息
+def format_weather_response(weather):
+    """格式化天气信息"""
+    return (f"{weather['city']}的天气情况：\n"
+            f"温度：{weather['temperature']}°C，体感温度：{weather['feels_like']}°C\n"
+            f"天气：{weather['description']}\n"
+            f"湿度：{weather['humidity']}%\n"
+            f"风速：{weather['wind_speed']}m/s")
@@ -0,0 +1,26 @@
+"""
+服务器与客户端共用的城市信息
+"""
+
+# 中国主要城市信息: 中文名 -> (OpenWeatherMap城市ID, 英文名)
+CITY_INFO = {
+    "北京": (1816670, "Beijing"),
+    "上海": (1796236, "Shanghai"),
+    "广州": (1809858, "Guangzhou"),
+    "深圳": (1795565, "Shenzhen"),
+    "成都": (1815286, "Chengdu"),
+    "重庆": (1814906, "Chongqing"),
+    "杭州": (1808926, "Hangzhou"),
+    "武汉": (1791247, "Wuhan"),
+    "西安": (1790630, "Xian"),
+    "南京": (1799962, "Nanjing"),
+    "天津": (1792947, "Tianjin"),
+    "苏州": (1795940, "Suzhou"),
+    "郑州": (1784658, "Zhengzhou"),
+    "长沙": (1815577, "Changsha"),
+    "青岛": (1797929, "Qingdao"),
+    "沈阳": (2034937, "Shenyang"),
+    "大连": (1814087, "Dalian"),
+    "厦门": (1790923, "Xiamen"),
+    "济南": (1805753, "Jinan")
+}
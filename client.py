@@ -1,12 +1,16 @@
 import os
+import re
 import json
 import asyncio
+import contextvars
 from dotenv import load_dotenv
 import httpx
+import orjson
 import argparse
 import logging
+import threading
 import inspect
-from typing import Dict, Any, List, Optional, Callable, Union, Awaitable
+from typing import Dict, Any, List, Optional, Callable, Union, Awaitable, Tuple
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, 
@@ -18,11 +22,18 @@ from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, Tool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_deepseek import ChatDeepSeek
 from langchain_core.tools import BaseTool, tool
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.openai_tools import format_to_openai_tool_messages
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 
+# 热点路径的回调与格式化函数，执行 python setup.py build_ext --inplace 后会加载Cython编译版本
+from _fast import MCPCallbackHandler, format_weather_response
+from cities import CITY_INFO
+
 # 加载环境变量
 load_dotenv()
 
@@ -35,47 +46,109 @@ if not DEEPSEEK_API_KEY:
 DEFAULT_MCP_PORT = 8765
 MCP_SERVER_URL = f"http://localhost:{DEFAULT_MCP_PORT}/v1/mcp"
 
-# 自定义回调处理器，记录工具调用过程
-class MCPCallbackHandler(BaseCallbackHandler):
-    """记录MCP工具调用过程的回调处理器"""
-    
-    def __init__(self, verbose=False):
-        self.verbose = verbose
-    
-    def on_llm_start(self, serialized, prompts, **kwargs):
-        logger.debug(f"LLM开始思考，提示: {prompts[0][:100]}...")
-        if self.verbose:
-            print("\n" + "="*50)
-            print("【LLM开始思考】")
-    
-    def on_llm_end(self, response, **kwargs):
-        if self.verbose:
-            print("\n" + "="*50)
-            print("【LLM思考完成】")
-    
-    def on_tool_start(self, serialized, input_str, **kwargs):
-        logger.info(f"开始执行工具: {serialized.get('name', 'unknown')}, 输入: {input_str}")
-        if self.verbose:
-            print("\n" + "-"*50)
-            print(f"【开始执行工具】: {serialized.get('name', 'unknown')}")
-            print(f"输入参数: {input_str}")
-    
-    def on_tool_end(self, output, **kwargs):
-        logger.info(f"工具执行完成，输出: {output[:100]}...")
-        if self.verbose:
-            print("\n" + "-"*50)
-            print("【工具执行结果】")
-            print(f"输出: {output}")
+# 简单单位转换表: (原始单位, 目标单位) -> (倍率, 偏移)，结果 = 值 * 倍率 + 偏移
+UNIT_CONVERSIONS = {
+    # 长度转换
+    ("km", "m"): (1000.0, 0.0),
+    ("m", "km"): (1e-3, 0.0),
+    ("m", "cm"): (100.0, 0.0),
+    ("cm", "m"): (1e-2, 0.0),
+    # 重量转换
+    ("kg", "g"): (1000.0, 0.0),
+    ("g", "kg"): (1e-3, 0.0),
+    # 温度转换
+    ("C", "F"): (9 / 5, 32.0),
+    ("F", "C"): (5 / 9, -32 * 5 / 9),
+}
+
+# 代理系统提示（通用，包含全部函数）
+SYSTEM_PROMPT = """
+你是一个功能强大的助手，使用MCP (Model Control Protocol) 协议与外部系统交互。
+
+MCP协议允许你调用以下函数:
+
+1. get_weather: 获取指定城市的天气信息
+   - 参数: city (城市名称，如北京、上海、广州等)
+
+2. unit_converter: 在不同单位之间转换值
+   - 参数: value (要转换的数值)，from_unit (原始单位)，to_unit (目标单位)
+   - 支持的单位: km/m/cm(长度)、kg/g(重量)、C/F(温度)
+
+当用户请求需要实时数据或特定计算时，你应该:
+1. 分析用户需求，确定是否需要外部数据
+2. 选择合适的MCP函数
+3. 准备所需参数
+4. 调用函数获取结果
+5. 基于结果提供答案
+
+如果需要多次调用函数且各调用之间互不依赖（例如同时查询多个城市的天气，
+或查询天气的同时进行单位转换），请在同一次回复中一次性发出所有函数调用，
+它们会被并发执行；只有当某个调用的参数依赖另一个调用的结果时，才分步调用。
+
+在决策过程中，请清晰解释你的推理:
+
+推理分析: [解释你如何理解用户需求以及为什么选择特定函数]
+MCP函数选择: [说明选择哪个函数以及为什么]
+参数准备: [说明每个参数如何从用户请求中提取或推断]
+"""
+
+# 只涉及天气查询时使用的精简提示
+SYSTEM_PROMPT_WEATHER = """
+你是一个天气助手，使用MCP (Model Control Protocol) 协议获取实时天气。
+
+可调用函数 get_weather: 获取指定城市的天气信息
+   - 参数: city (城市名称，如北京、上海、广州等)
+
+需要查询多个城市时，请在同一次回复中一次性发出所有函数调用，它们会被并发执行。
+请基于函数返回的结果回答用户。
+"""
+
+# 只涉及单位转换时使用的精简提示
+SYSTEM_PROMPT_CONVERT = """
+你是一个单位转换助手，使用MCP (Model Control Protocol) 协议完成计算。
+
+可调用函数 unit_converter: 在不同单位之间转换值
+   - 参数: value (要转换的数值)，from_unit (原始单位)，to_unit (目标单位)
+   - 支持的单位: km/m/cm(长度)、kg/g(重量)、C/F(温度)
+
+需要多次转换时，请在同一次回复中一次性发出所有函数调用，它们会被并发执行。
+请基于函数返回的结果回答用户。
+"""
+
+# 意图识别关键词，只命中一类时使用对应的精简提示和工具
+# 单位名称（如摄氏度、km）本身不足以判断为转换，天气问题同样会提到，只有明确的转换动词才算
+WEATHER_PATTERN = re.compile(r"(天气|weather|温度|气温|多少度|下雨|下雪)", re.IGNORECASE)
+CONVERT_PATTERN = re.compile(r"(转换|换算|convert|换成|折合)", re.IGNORECASE)
+
+def detect_intent(query: str) -> str:
+    """
+    粗略识别用户查询的意图
     
-    def on_agent_action(self, action, **kwargs):
-        logger.info(f"代理决定执行: {action.tool}, 输入: {action.tool_input}")
-        if self.verbose:
-            print("\n" + "="*50)
-            print("【代理决策】")
-            print(f"选择工具: {action.tool}")
-            print(f"工具输入: {action.tool_input}")
-            if hasattr(action, "log") and action.log:
-                print(f"推理过程: {action.log}")
+    Returns:
+        "weather"、"convert"，两类都命中或都未命中时返回 "full"
+    """
+    is_weather = WEATHER_PATTERN.search(query) is not None
+    is_convert = CONVERT_PATTERN.search(query) is not None
+    if is_weather and not is_convert:
+        return "weather"
+    if is_convert and not is_weather:
+        return "convert"
+    return "full"
+
+# 从天气查询中提取已知城市名，用于在大模型推理的同时预取天气
+# 只匹配CITY_INFO中的城市，避免把“今天”“现在”等词当作城市发起无效查询
+KNOWN_CITY_PATTERN = re.compile("|".join(map(re.escape, CITY_INFO)))
+
+def guess_city(query: str) -> Optional[str]:
+    """猜测天气查询中的城市名，不是天气查询或没有已知城市时返回None"""
+    if WEATHER_PATTERN.search(query) is None:
+        return None
+    match = KNOWN_CITY_PATTERN.search(query)
+    return match.group(0) if match else None
+
+# 当前查询的天气预取: (猜测的城市, 预取任务)
+_speculative_weather: contextvars.ContextVar[Optional[Tuple[str, asyncio.Task]]] = \
+    contextvars.ContextVar("speculative_weather", default=None)
 
 # 定义每个工具的参数模型
 class WeatherParams(BaseModel):
@@ -86,6 +159,107 @@ class ConverterParams(BaseModel):
     from_unit: str = Field(description="原始单位，如km、m、cm、kg、g、C、F等")
     to_unit: str = Field(description="目标单位，如km、m、cm、kg、g、C、F等")
 
+class MCPCallBatcher:
+    """合并短时间内发出的MCP函数调用，通过一次HTTP请求发送到服务器"""
+    
+    def __init__(self, http: httpx.AsyncClient, server_url: str,
+                 max_batch: int = 8, max_delay: float = 0.005):
+        """
+        初始化批量调用器
+        
+        Args:
+            http: 复用的HTTP客户端
+            server_url: MCP服务器URL，批量端点为 server_url + "/batch"
+            max_batch: 累积到该数量的调用时立即发送
+            max_delay: 第一个调用进入队列后最多等待的秒数。同一轮并发的工具调用在进入这里前
+                       会经过回调等异步跳转，到达时间相差不到1ms，较短的窗口即可合并；
+                       为0时在当前事件循环轮次结束后立即发送
+        """
+        self._http = http
+        self.server_url = server_url
+        self.batch_url = f"{server_url}/batch"
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._inflight = set()
+    
+    async def call(self, function_name: str, parameters: Dict[str, Any]) -> Dict:
+        """将一次函数调用加入队列，等待所在批次返回结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((function_name, parameters, future))
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            if self.max_delay > 0:
+                self._timer = loop.call_later(self.max_delay, self._flush)
+            else:
+                self._timer = loop.call_soon(self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """把当前队列中的调用作为一个批次发送"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        # 保存任务引用，避免发送过程中被垃圾回收
+        task = asyncio.create_task(self._send(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+    
+    async def _send(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        """发送一个批次并把结果分发给各个调用方"""
+        calls = [
+            {"function_name": function_name, "parameters": parameters}
+            for function_name, parameters, _ in batch
+        ]
+        
+        try:
+            # 只有一个调用时直接使用单次调用端点
+            if len(calls) == 1:
+                results = [await self._post(self.server_url, calls[0])]
+            else:
+                logger.info("MCP批量调用: %d个函数", len(calls))
+                reply = await self._post(self.batch_url, {"calls": calls})
+                results = reply["results"] if "results" in reply else [reply] * len(calls)
+        except Exception as e:
+            logger.error("MCP函数调用出错: %s", e)
+            results = [{"error": str(e)}] * len(calls)
+        
+        # 服务器返回的结果数量不符时，缺失的调用以错误结果返回，避免调用方一直等待
+        if len(results) != len(calls):
+            logger.error("MCP批量调用结果数量不符: 请求%d个，返回%d个", len(calls), len(results))
+            missing = {"error": "MCP批量调用返回的结果数量不符"}
+            results = list(results[:len(calls)]) + [missing] * (len(calls) - len(results))
+        
+        for (_, _, future), result in zip(batch, results):
+            # 调用方可能已经取消等待
+            if not future.done():
+                future.set_result(result)
+    
+    async def _post(self, url: str, payload: Dict[str, Any]) -> Dict:
+        """MCP协议: 发送请求到服务器并解析响应"""
+        response = await self._http.post(
+            url,
+            content=orjson.dumps(payload),
+            headers={"content-type": "application/json"}
+        )
+        
+        # 处理MCP响应
+        if response.status_code != 200:
+            logger.error("MCP服务器错误: %s", response.status_code)
+            return {"error": f"MCP错误 ({response.status_code})"}
+        
+        return orjson.loads(response.content)
+
 class MCPClient:
     """MCP (Model Control Protocol) 客户端实现"""
     
@@ -107,6 +281,15 @@ class MCPClient:
             api_key=llm_api_key
         )
         
+        # 复用的HTTP客户端，保持与MCP服务器的长连接
+        self._http = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+        
+        # 合并并发的MCP调用，减少HTTP往返次数
+        self._batcher = MCPCallBatcher(self._http, server_url)
+        
         # 本地函数注册表
         self.local_functions = {}
         
@@ -116,6 +299,36 @@ class MCPClient:
             self._create_converter_tool()
         ]
         
+        # 工具的OpenAI函数调用JSON schema只生成一次，供各个代理共享
+        self._openai_tools = {t.name: convert_to_openai_tool(t) for t in self.tools}
+        
+        # 提示模板和代理只依赖工具定义，按意图各构建一次后在所有查询间复用
+        weather_tool, converter_tool = self.tools
+        self._agents = {
+            "full": self._build_agent(SYSTEM_PROMPT, self.tools),
+            "weather": self._build_agent(SYSTEM_PROMPT_WEATHER, [weather_tool]),
+            "convert": self._build_agent(SYSTEM_PROMPT_CONVERT, [converter_tool]),
+        }
+        
+    def _build_agent(self, system_prompt: str, tools: List[BaseTool]):
+        """使用指定的系统提示和工具创建代理，返回 (代理, 工具列表)"""
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad")
+        ])
+        # 等价于create_openai_tools_agent，但直接绑定预先生成的工具schema
+        llm_with_tools = self.llm.bind(tools=[self._openai_tools[t.name] for t in tools])
+        agent = (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_openai_tool_messages(x["intermediate_steps"])
+            )
+            | prompt
+            | llm_with_tools
+            | OpenAIToolsAgentOutputParser()
+        )
+        return agent, tools
+        
     def _create_weather_tool(self):
         """创建天气工具"""
         
@@ -123,6 +336,14 @@ class MCPClient:
         @tool(args_schema=WeatherParams)
         async def get_weather(city: str) -> str:
             """获取指定城市的天气信息，参数为城市名称，如北京、上海、广州等"""
+            # 大模型选择的城市与预取的一致时，直接使用预取结果
+            speculative = _speculative_weather.get()
+            if speculative is not None:
+                city_guess, spec_task = speculative
+                if city == city_guess and not spec_task.cancelled():
+                    logger.info("使用预取的天气结果: %s", city)
+                    # 预取任务由多个调用共享，单个调用被取消时不应取消预取
+                    return await asyncio.shield(spec_task)
             return await self._call_mcp_get_weather(city)
             
         return get_weather
@@ -133,7 +354,7 @@ class MCPClient:
         @tool(args_schema=ConverterParams)
         async def unit_converter(value: float, from_unit: str, to_unit: str) -> str:
             """单位转换工具，可以在不同单位之间转换值"""
-            return await self._unit_converter(value, from_unit, to_unit)
+            return self._unit_converter(value, from_unit, to_unit)
             
         return unit_converter
     
@@ -146,30 +367,14 @@ class MCPClient:
         else:
             return f"获取天气信息失败: {result.get('error', '未知错误')}"
     
-    async def _unit_converter(self, value: float, from_unit: str, to_unit: str) -> str:
+    def _unit_converter(self, value: float, from_unit: str, to_unit: str) -> str:
         """本地实现的单位转换函数"""
-        # 简单单位转换表
-        conversions = {
-            # 长度转换
-            ("km", "m"): lambda x: x * 1000,
-            ("m", "km"): lambda x: x / 1000,
-            ("m", "cm"): lambda x: x * 100,
-            ("cm", "m"): lambda x: x / 100,
-            # 重量转换
-            ("kg", "g"): lambda x: x * 1000,
-            ("g", "kg"): lambda x: x / 1000,
-            # 温度转换
-            ("C", "F"): lambda x: x * 9/5 + 32,
-            ("F", "C"): lambda x: (x - 32) * 5/9,
-        }
-        
         # 检查是否支持此转换
-        key = (from_unit, to_unit)
-        if key in conversions:
-            result = conversions[key](value)
-            return f"{value} {from_unit} = {result:.2f} {to_unit}"
-        else:
+        conversion = UNIT_CONVERSIONS.get((from_unit, to_unit))
+        if conversion is None:
             return f"不支持从 {from_unit} 到 {to_unit} 的转换"
+        scale, offset = conversion
+        return f"{value} {from_unit} = {value * scale + offset:.2f} {to_unit}"
     
     async def _call_mcp_function(self, function_name: str, parameters: Dict[str, Any]) -> Dict:
         """
@@ -182,35 +387,17 @@ class MCPClient:
         Returns:
             函数调用结果
         """
-        logger.info(f"MCP函数调用: {function_name}({parameters})")
+        logger.info("MCP函数调用: %s(%s)", function_name, parameters)
         
-        try:
-            # 构建MCP请求
-            mcp_request = {
-                "function_name": function_name,
-                "parameters": parameters
-            }
-            
-            # MCP协议: 发送函数调用请求到服务器
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.server_url,
-                    json=mcp_request,
-                    timeout=10.0
-                )
-                
-                # 处理MCP响应
-                if response.status_code != 200:
-                    logger.error(f"MCP服务器错误: {response.status_code}")
-                    return {"error": f"MCP错误 ({response.status_code})"}
-                
-                result = response.json()
-                logger.info(f"MCP响应成功: {function_name}")
-                return result
-                
-        except Exception as e:
-            logger.error(f"MCP函数调用出错: {str(e)}")
-            return {"error": str(e)}
+        # MCP协议: 发送函数调用请求到服务器，同一时间窗口内的调用会合并为一次请求
+        result = await self._batcher.call(function_name, parameters)
+        if "error" not in result:
+            logger.info("MCP响应成功: %s", function_name)
+        return result
+    
+    async def aclose(self):
+        """关闭与MCP服务器的HTTP连接"""
+        await self._http.aclose()
     
     async def handle_query(self, query: str, verbose: bool = False) -> str:
         """
@@ -223,67 +410,50 @@ class MCPClient:
         Returns:
             处理结果
         """
-        # 构建系统提示
-        system_message = """
-        你是一个功能强大的助手，使用MCP (Model Control Protocol) 协议与外部系统交互。
-        
-        MCP协议允许你调用以下函数:
-        
-        1. get_weather: 获取指定城市的天气信息
-           - 参数: city (城市名称，如北京、上海、广州等)
-        
-        2. unit_converter: 在不同单位之间转换值
-           - 参数: value (要转换的数值)，from_unit (原始单位)，to_unit (目标单位)
-           - 支持的单位: km/m/cm(长度)、kg/g(重量)、C/F(温度)
-        
-        当用户请求需要实时数据或特定计算时，你应该:
-        1. 分析用户需求，确定是否需要外部数据
-        2. 选择合适的MCP函数
-        3. 准备所需参数
-        4. 调用函数获取结果
-        5. 基于结果提供答案
-        
-        在决策过程中，请清晰解释你的推理:
-        
-        推理分析: [解释你如何理解用户需求以及为什么选择特定函数]
-        MCP函数选择: [说明选择哪个函数以及为什么]
-        参数准备: [说明每个参数如何从用户请求中提取或推断]
-        """
+        # 根据意图选择提示和工具，减少发送给大模型的输入
+        intent = detect_intent(query)
+        agent, tools = self._agents[intent]
         
         if verbose:
             print(f"\n用户查询: {query}")
             print("="*50)
-            print("使用LangChain处理查询...")
+            print(f"使用LangChain处理查询 (意图: {intent})...")
         
         try:
-            # 创建LangChain提示模板
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", system_message),
-                ("human", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad")
-            ])
-            
-            # 创建代理
-            agent = create_openai_tools_agent(self.llm, self.tools, prompt)
-            
             # 创建回调处理器
             callbacks = [MCPCallbackHandler(verbose=verbose)]
             
             # 创建并配置代理执行器
             agent_executor = AgentExecutor(
                 agent=agent,
-                tools=self.tools,
+                tools=tools,
                 verbose=verbose,
                 callbacks=callbacks,
                 handle_parsing_errors=True,
-                return_intermediate_steps=True
+                # 只有详细模式下才展示中间步骤，否则不保留
+                return_intermediate_steps=verbose
             )
             
-            # 执行代理
-            response = await agent_executor.ainvoke({"input": query})
+            # 猜测查询中的城市，在大模型首次推理的同时预取天气
+            city_guess = guess_city(query)
+            spec_task = None
+            if city_guess:
+                spec_task = asyncio.create_task(self._call_mcp_get_weather(city_guess))
+                token = _speculative_weather.set((city_guess, spec_task))
+            
+            try:
+                # 执行代理
+                response = await agent_executor.ainvoke({"input": query})
+            finally:
+                # 预取结果未被使用时取消
+                if spec_task is not None:
+                    spec_task.cancel()
+                    # 取出未被使用的预取结果或异常，避免"Task exception was never retrieved"
+                    spec_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                    _speculative_weather.reset(token)
             
             # 显示中间步骤
-            if verbose and "intermediate_steps" in response:
+            if verbose and response.get("intermediate_steps"):
                 print("\n" + "="*50)
                 print("代理执行完成，中间步骤摘要:")
                 print("="*50)
@@ -298,19 +468,74 @@ class MCPClient:
             return response["output"]
             
         except Exception as e:
-            logger.error(f"处理查询出错: {str(e)}")
+            logger.error("处理查询出错: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return f"处理查询时发生错误: {str(e)}"
 
-# 辅助函数：格式化天气信息
-def format_weather_response(weather):
-    """格式化天气信息"""
-    return (f"{weather['city']}的天气情况：\n"
-            f"温度：{weather['temperature']}°C，体感温度：{weather['feels_like']}°C\n"
-            f"天气：{weather['description']}\n"
-            f"湿度：{weather['humidity']}%\n"
-            f"风速：{weather['wind_speed']}m/s")
+async def ainput(prompt: str = "") -> str:
+    """
+    在守护线程中读取一行输入，不阻塞事件循环
+    
+    读取线程不属于默认线程池，Ctrl+C取消等待后事件循环可以立即退出，
+    无需等到用户按下回车；进程退出时守护线程随之结束。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def deliver(result, error):
+        # 等待方可能已经被取消
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def reader():
+        try:
+            result, error = input(prompt), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(deliver, result, error)
+        except RuntimeError:
+            # 事件循环已经关闭，输入不再需要
+            pass
+    
+    threading.Thread(target=reader, daemon=True).start()
+    return await future
+
+async def run_client(port: int = DEFAULT_MCP_PORT, verbose: bool = False):
+    """
+    运行交互式客户端，直到用户输入退出
+    
+    Args:
+        port: MCP服务器端口号
+        verbose: 是否显示详细日志
+    """
+    # 更新MCP服务器URL
+    mcp_server_url = f"http://localhost:{port}/v1/mcp"
+    
+    print(f"=== MCP协议 + LangChain 天气查询示例 ===")
+    print(f"连接到MCP服务器: {mcp_server_url}")
+    print("输入'退出'结束程序")
+    
+    # 创建MCP客户端
+    mcp_client = MCPClient(mcp_server_url, DEEPSEEK_API_KEY)
+    
+    try:
+        while True:
+            # 在守护线程中读取输入，避免阻塞同一事件循环中运行的服务器，Ctrl+C时也能立即退出
+            user_input = await ainput("\n请输入您的天气查询: ")
+            if user_input.lower() in ["退出", "exit", "quit"]:
+                break
+            
+            # 使用MCP客户端处理查询
+            result = await mcp_client.handle_query(user_input, verbose)
+            print("\n" + result)
+    finally:
+        await mcp_client.aclose()
 
 async def main():
     """主函数"""
@@ -329,24 +554,10 @@ async def main():
         logging.getLogger().setLevel(logging.DEBUG)
         logger.setLevel(logging.DEBUG)
     
-    # 更新MCP服务器URL
-    mcp_server_url = f"http://localhost:{args.port}/v1/mcp"
-    
-    print(f"=== MCP协议 + LangChain 天气查询示例 ===")
-    print(f"连接到MCP服务器: {mcp_server_url}")
-    print("输入'退出'结束程序")
-    
-    # 创建MCP客户端
-    mcp_client = MCPClient(mcp_server_url, DEEPSEEK_API_KEY)
-    
-    while True:
-        user_input = input("\n请输入您的天气查询: ")
-        if user_input.lower() in ["退出", "exit", "quit"]:
-            break
-        
-        # 使用MCP客户端处理查询
-        result = await mcp_client.handle_query(user_input, args.verbose)
-        print("\n" + result)
+    await run_client(args.port, args.verbose)
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass 
\ No newline at end of file
@@ -6,10 +6,8 @@ MCP天气查询示例
 
 import os
 import sys
+import asyncio
 import argparse
-import threading
-import subprocess
-import time
 import socket
 
 # 默认MCP服务器端口
@@ -24,22 +22,54 @@ def is_port_available(port):
         except socket.error:
             return False
 
-def find_available_port(start_port=8700, max_attempts=100):
-    """寻找可用端口"""
-    for port in range(start_port, start_port + max_attempts):
-        if is_port_available(port):
-            return port
-    raise RuntimeError(f"无法找到可用端口 ({start_port} - {start_port + max_attempts - 1})")
+def find_available_port():
+    """寻找可用端口，由操作系统直接分配一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
 
 def start_server(port):
     """启动MCP服务器"""
+    from server import run_server
+    
     print(f"启动MCP服务器 (端口: {port})...")
-    subprocess.run(["python", "server.py", "--port", str(port)])
+    asyncio.run(run_server(port))
 
 def start_client(port):
     """启动MCP客户端"""
+    from client import run_client
+    
     print(f"启动MCP客户端 (连接端口: {port})...")
-    subprocess.run(["python", "client.py", "--port", str(port)])
+    asyncio.run(run_client(port))
+
+async def run_all(port):
+    """在同一个事件循环中运行服务器和客户端"""
+    from server import create_server
+    from client import run_client
+    
+    print(f"启动MCP服务器 (端口: {port})...")
+    server = create_server(port)
+    server_task = asyncio.create_task(server.serve())
+    
+    # 等待服务器启动
+    print("等待服务器启动...")
+    while not server.started:
+        if server_task.done():
+            # 服务器启动失败，抛出其中的异常
+            await server_task
+            return
+        await asyncio.sleep(0.05)
+    
+    # 启动客户端，退出后关闭服务器
+    print(f"启动MCP客户端 (连接端口: {port})...")
+    client_task = asyncio.create_task(run_client(port))
+    try:
+        # 用户退出客户端，或Ctrl+C被uvicorn捕获使服务器先行停止
+        await asyncio.wait({client_task, server_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        server.should_exit = True
+        client_task.cancel()
+        await asyncio.gather(client_task, server_task, return_exceptions=True)
 
 def check_api_keys():
     """检查API密钥是否已设置"""
@@ -87,22 +117,16 @@ def main():
     
     print(f"使用端口 {port} 进行MCP通信")
     
-    if args.server:
-        start_server(port)
-    elif args.client:
-        start_client(port)
-    else:
-        # 同时启动服务器和客户端
-        server_thread = threading.Thread(target=start_server, args=(port,))
-        server_thread.daemon = True
-        server_thread.start()
-        
-        # 等待服务器启动
-        print("等待服务器启动...")
-        time.sleep(2)
-        
-        # 启动客户端
-        start_client(port)
+    try:
+        if args.server:
+            start_server(port)
+        elif args.client:
+            start_client(port)
+        else:
+            # 同时启动服务器和客户端
+            asyncio.run(run_all(port))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
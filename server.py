@@ -1,59 +1,86 @@
 import os
-import json
+import time
+import asyncio
 import httpx
+import msgspec
 from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 import uvicorn
 import argparse
 
+from cities import CITY_INFO
+
 # 加载环境变量
 load_dotenv()
 
-app = FastAPI(title="天气查询MCP服务器")
+app = FastAPI(title="天气查询MCP服务器", default_response_class=ORJSONResponse)
+
+# 复用的OpenWeatherMap HTTP客户端，在服务器启动时创建
+# 使用HTTPS + HTTP/2，并发请求在同一连接上多路复用
+@app.on_event("startup")
+async def startup():
+    app.state.owm = httpx.AsyncClient(
+        http2=True,
+        base_url="https://api.openweathermap.org",
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=32)
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.owm.aclose()
 
 # 获取OpenWeatherMap API密钥
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
 if not OPENWEATHER_API_KEY:
     raise ValueError("请在.env文件中设置OPENWEATHERMAP_API_KEY")
 
-# 中国主要城市ID映射
-CHINA_CITY_IDS = {
-    "北京": 1816670,
-    "上海": 1796236,
-    "广州": 1809858,
-    "深圳": 1795565,
-    "成都": 1815286,
-    "重庆": 1814906,
-    "杭州": 1808926,
-    "武汉": 1791247,
-    "西安": 1790630,
-    "南京": 1799962,
-    "天津": 1792947,
-    "苏州": 1795940,
-    "郑州": 1784658,
-    "长沙": 1815577,
-    "青岛": 1797929,
-    "沈阳": 2034937,
-    "大连": 1814087,
-    "厦门": 1790923,
-    "济南": 1805753
-}
+# OpenWeatherMap响应结构，只声明用到的字段，其余字段在解码时忽略
+class OWMSys(msgspec.Struct):
+    country: str
+
+class OWMMain(msgspec.Struct):
+    temp: float
+    feels_like: float
+    humidity: int
+
+class OWMWeather(msgspec.Struct):
+    description: str
+    icon: str
+
+class OWMWind(msgspec.Struct):
+    speed: float
+
+class OWMResponse(msgspec.Struct):
+    name: str
+    sys: OWMSys
+    main: OWMMain
+    weather: list[OWMWeather]
+    wind: OWMWind
+
+# 天气结果缓存: 规范化城市名 -> (写入时间, 响应)
+# OpenWeatherMap的数据大约每10分钟更新一次，短时间内重复查询直接返回缓存
+_CACHE_TTL = 300
+_WEATHER_CACHE: dict[str, tuple[float, dict]] = {}
+# 每个城市一把锁，合并同一城市并发的重复请求
+_WEATHER_LOCKS: dict[str, asyncio.Lock] = {}
 
 # MCP协议处理
-class MCPRequest(BaseModel):
+class MCPRequest(msgspec.Struct):
     function_name: str
     parameters: dict
 
+@app.exception_handler(msgspec.DecodeError)
+async def handle_decode_error(request: Request, exc: msgspec.DecodeError):
+    # msgspec.ValidationError是DecodeError的子类，缺少字段或类型错误同样返回400
+    return ORJSONResponse(status_code=400, content={"detail": f"请求格式错误: {exc}"})
+
 @app.post("/v1/mcp")
 async def handle_mcp_request(request: Request):
-    body = await request.json()
-    
-    if "function_name" not in body or "parameters" not in body:
-        raise HTTPException(status_code=400, detail="请求格式错误，缺少function_name或parameters")
-    
-    function_name = body["function_name"]
-    parameters = body["parameters"]
+    req = msgspec.json.decode(await request.body(), type=MCPRequest)
+    function_name = req.function_name
+    parameters = req.parameters
     
     # 处理不同的函数
     if function_name == "get_weather":
@@ -61,120 +88,142 @@ async def handle_mcp_request(request: Request):
     else:
         raise HTTPException(status_code=404, detail=f"未找到函数: {function_name}")
 
+class MCPBatchRequest(msgspec.Struct):
+    calls: list[MCPRequest]
+
+@app.post("/v1/mcp/batch")
+async def handle_mcp_batch_request(request: Request):
+    batch = msgspec.json.decode(await request.body(), type=MCPBatchRequest)
+    
+    # 并发执行批次中的所有调用，结果顺序与请求顺序一致
+    results = await asyncio.gather(*(dispatch(call) for call in batch.calls))
+    return {"results": results}
+
+async def dispatch(call: MCPRequest):
+    """执行批次中的单个调用，未知函数或执行出错都以错误结果返回，不影响同批次的其他调用"""
+    try:
+        if call.function_name == "get_weather":
+            return await get_weather(call.parameters)
+        else:
+            return {"error": f"未找到函数: {call.function_name}"}
+    except Exception as e:
+        error_message = f"执行函数 {call.function_name} 时出错: {str(e)}"
+        print(error_message)
+        return {"error": error_message}
+
 async def get_weather(parameters):
     city = parameters.get("city")
     if not city:
         return {"error": "请提供城市名称"}
+    if not isinstance(city, str):
+        return {"error": "城市名称必须是字符串"}
     
     # 打印接收到的城市名称
     print(f"接收到天气查询请求，城市: {city}")
     
+    city = city.strip()
+    key = city.lower()
+    cached = _get_cached_weather(key)
+    if cached is not None:
+        print(f"命中天气缓存: {city}")
+        return cached
+    
+    lock = _WEATHER_LOCKS.setdefault(key, asyncio.Lock())
     try:
-        async with httpx.AsyncClient() as client:
-            # 首先检查是否有城市ID
-            city_id = CHINA_CITY_IDS.get(city)
-            
-            # 如果有城市ID，直接使用ID查询
-            if city_id:
-                print(f"使用城市ID查询: {city_id}")
-                params = {
-                    "id": city_id,
-                    "appid": OPENWEATHER_API_KEY,
-                    "units": "metric",
-                    "lang": "zh_cn"
-                }
-            else:
-                # 针对中文城市名称，确保正确编码
-                params = {
-                    "q": city,
-                    "appid": OPENWEATHER_API_KEY,
-                    "units": "metric",
-                    "lang": "zh_cn"
-                }
-            
-            api_url = "http://api.openweathermap.org/data/2.5/weather"
-            print(f"正在调用OpenWeatherMap API: {api_url}，参数: {params}")
-            
-            response = await client.get(api_url, params=params)
+        async with lock:
+            # 等待锁期间，同一城市的其他请求可能已经写入缓存
+            cached = _get_cached_weather(key)
+            if cached is not None:
+                print(f"命中天气缓存: {city}")
+                return cached
             
-            # 记录API响应
-            print(f"OpenWeatherMap API响应状态码: {response.status_code}")
-            
-            if response.status_code != 200:
-                error_message = f"获取天气信息失败: {response.text}"
-                print(error_message)
-                
-                # 如果使用城市名称查询失败，而且我们没有使用城市ID，尝试转换为英文
-                if not city_id:
-                    city_translations = {
-                        "北京": "Beijing",
-                        "上海": "Shanghai",
-                        "广州": "Guangzhou",
-                        "深圳": "Shenzhen",
-                        "成都": "Chengdu",
-                        "重庆": "Chongqing",
-                        "杭州": "Hangzhou",
-                        "武汉": "Wuhan",
-                        "西安": "Xian",
-                        "南京": "Nanjing",
-                        "天津": "Tianjin",
-                        "苏州": "Suzhou",
-                        "郑州": "Zhengzhou",
-                        "长沙": "Changsha",
-                        "青岛": "Qingdao",
-                        "沈阳": "Shenyang",
-                        "大连": "Dalian",
-                        "厦门": "Xiamen",
-                        "济南": "Jinan"
-                    }
-                    
-                    english_name = city_translations.get(city)
-                    if english_name:
-                        print(f"尝试使用英文名称查询: {english_name}")
-                        response = await client.get(
-                            "http://api.openweathermap.org/data/2.5/weather",
-                            params={
-                                "q": english_name,
-                                "appid": OPENWEATHER_API_KEY,
-                                "units": "metric",
-                                "lang": "zh_cn"
-                            }
-                        )
-                        
-                        if response.status_code != 200:
-                            print(f"使用英文名称查询依然失败: {response.text}")
-                            return {
-                                "error": error_message,
-                                "status_code": response.status_code
-                            }
-                    else:
-                        return {
-                            "error": error_message,
-                            "status_code": response.status_code
-                        }
-                else:
-                    return {
-                        "error": error_message,
-                        "status_code": response.status_code
-                    }
-            
-            # 解析天气数据
-            weather_data = response.json()
-            print(f"获取到天气数据: {json.dumps(weather_data)}")
-            
-            weather_info = {
-                "city": weather_data["name"],
-                "country": weather_data["sys"]["country"],
-                "temperature": weather_data["main"]["temp"],
-                "feels_like": weather_data["main"]["feels_like"],
-                "description": weather_data["weather"][0]["description"],
-                "humidity": weather_data["main"]["humidity"],
-                "wind_speed": weather_data["wind"]["speed"],
-                "weather_icon": weather_data["weather"][0]["icon"]
+            result = await fetch_weather(city)
+            # 只缓存成功的结果，失败时下次请求重新查询
+            if "result" in result:
+                _store_weather(key, result)
+            return result
+    finally:
+        # 请求完成后移除锁；仍在等待的请求持有同一把锁，不受影响
+        if _WEATHER_LOCKS.get(key) is lock and not lock.locked():
+            del _WEATHER_LOCKS[key]
+
+def _get_cached_weather(key):
+    """读取未过期的缓存结果，过期条目在读取时删除"""
+    cached = _WEATHER_CACHE.get(key)
+    if cached is None:
+        return None
+    if time.monotonic() - cached[0] < _CACHE_TTL:
+        return cached[1]
+    del _WEATHER_CACHE[key]
+    return None
+
+def _store_weather(key, result):
+    """写入缓存，并顺带清理所有已过期的条目"""
+    now = time.monotonic()
+    expired = [k for k, (ts, _) in _WEATHER_CACHE.items() if now - ts >= _CACHE_TTL]
+    for k in expired:
+        del _WEATHER_CACHE[k]
+    _WEATHER_CACHE[key] = (now, result)
+
+async def fetch_weather(city):
+    """向OpenWeatherMap查询指定城市的天气"""
+    try:
+        # 首先检查是否有城市ID
+        info = CITY_INFO.get(city)
+        
+        # 如果有城市ID，直接使用ID查询
+        if info:
+            city_id, english_name = info
+            print(f"使用城市ID查询: {city_id} ({english_name})")
+            params = {
+                "id": city_id,
+                "appid": OPENWEATHER_API_KEY,
+                "units": "metric",
+                "lang": "zh_cn"
             }
+        else:
+            # 针对中文城市名称，确保正确编码
+            params = {
+                "q": city,
+                "appid": OPENWEATHER_API_KEY,
+                "units": "metric",
+                "lang": "zh_cn"
+            }
+        
+        api_path = "/data/2.5/weather"
+        print(f"正在调用OpenWeatherMap API: {api_path}，参数: {params}")
+        
+        response = await app.state.owm.get(api_path, params=params)
+        
+        # 记录API响应
+        print(f"OpenWeatherMap API响应状态码: {response.status_code}")
+        
+        if response.status_code != 200:
+            error_message = f"获取天气信息失败: {response.text}"
+            print(error_message)
             
-            return {"result": weather_info}
-            
+            return {
+                "error": error_message,
+                "status_code": response.status_code
+            }
+        
+        # 解析天气数据
+        print(f"获取到天气数据: {response.text}")
+        data = msgspec.json.decode(response.content, type=OWMResponse)
+        
+        weather_info = {
+            "city": data.name,
+            "country": data.sys.country,
+            "temperature": data.main.temp,
+            "feels_like": data.main.feels_like,
+            "description": data.weather[0].description,
+            "humidity": data.main.humidity,
+            "wind_speed": data.wind.speed,
+            "weather_icon": data.weather[0].icon
+        }
+        
+        return {"result": weather_info}
+        
     except Exception as e:
         error_message = f"获取天气信息时出错: {str(e)}"
         print(error_message)
@@ -182,12 +231,30 @@ async def get_weather(parameters):
         print(traceback.format_exc())
         return {"error": error_message}
 
+def create_server(port):
+    """创建在当前事件循环中运行的uvicorn服务器，可通过server.started判断是否已就绪"""
+    config = uvicorn.Config(app, host="0.0.0.0", port=port, http="httptools")
+    return uvicorn.Server(config)
+
+async def run_server(port):
+    """在当前事件循环中运行MCP服务器，直到收到退出信号"""
+    await create_server(port).serve()
+
 if __name__ == "__main__":
     # 解析命令行参数
     parser = argparse.ArgumentParser(description="MCP天气查询服务器")
     parser.add_argument("--port", type=int, default=8765, help="服务器端口号，默认8765")
+    parser.add_argument("--dev", action="store_true", help="开发模式: 单进程并在代码变更时自动重载")
     args = parser.parse_args()
     
     port = args.port
     print(f"MCP服务器正在启动，将监听端口: {port}")
-    uvicorn.run("server:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=port,
+        reload=args.dev,
+        workers=1 if args.dev else os.cpu_count(),
+        loop="auto",
+        http="httptools"
+    ) 
\ No newline at end of file
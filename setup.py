@@ -0,0 +1,17 @@
+"""
+将客户端热点模块编译为Cython扩展:
+
+    python setup.py build_ext --inplace
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="mcp_demo_fast",
+    ext_modules=cythonize(
+        ["_fast.py"],
+        language_level=3,
+        compiler_directives={"boundscheck": False}
+    ),
+)